@@ -57,6 +57,9 @@ import platform
 from datetime import datetime as dt, timedelta, time, date
 from time import sleep
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import atexit
 from threading import Thread
 import numpy as np
 if not hasattr(np, "NaN"):
@@ -166,7 +169,14 @@ def Shoonya_login():
             
         LogFile  =  LogFolder + "Finvasia_TT_" + str(userid) + "_" + str(Timestamp)  + str('.log') 
 
-        logging.basicConfig(filename=LogFile, format='%(asctime)s %(message)s', filemode='w')
+        # Trading threads only enqueue records; a background listener writes the file
+        log_queue = queue.Queue(-1)
+        file_handler = logging.FileHandler(LogFile, mode='w')
+        file_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        log_listener = QueueListener(log_queue, file_handler)
+        log_listener.start()
+        atexit.register(log_listener.stop)
+        logging.basicConfig(format='%(message)s', handlers=[QueueHandler(log_queue)])
         logger = logging.getLogger() 
         logger.setLevel(logging.INFO)
 
@@ -1391,7 +1401,7 @@ def LoadInstrument_token(Token_4_Exchange = ['NSE','BSE','NFO', 'BFO','CDS','MCX
             r = requests.get(f"{url}", allow_redirects=True)
             open(zip_file, "wb").write(r.content)
             df_ins_NFO = pd.read_csv(zip_file)
-            df_ins_NFO['Expiry'] = pd.to_datetime(df_ins_NFO['Expiry']).apply(lambda x: x.date())
+            df_ins_NFO['Expiry'] = pd.to_datetime(df_ins_NFO['Expiry']).dt.date
             df_ins_NFO = df_ins_NFO.sort_values(by=['Expiry',"Symbol",'StrikePrice'], ascending=[True,True,True])
             df_ins_NFO = df_ins_NFO.astype({"StrikePrice": str}) 
             os.remove(zip_file)
@@ -1412,7 +1422,7 @@ def LoadInstrument_token(Token_4_Exchange = ['NSE','BSE','NFO', 'BFO','CDS','MCX
                                 df_ins_BFO['TradingSymbol'].str.extract(r'(.*?)(?:\d)', expand=False)
                                 )
             df_ins_BFO.insert(3, "Symbol", bfo_symbols)
-            df_ins_BFO['Expiry'] = pd.to_datetime(df_ins_BFO['Expiry']).apply(lambda x: x.date())
+            df_ins_BFO['Expiry'] = pd.to_datetime(df_ins_BFO['Expiry']).dt.date
             df_ins_BFO = df_ins_BFO.sort_values(by=['Expiry',"Symbol",'StrikePrice'], ascending=[True,True,True])
             df_ins_BFO = df_ins_BFO.astype({"StrikePrice": str}) 
             os.remove(zip_file)
@@ -1428,7 +1438,7 @@ def LoadInstrument_token(Token_4_Exchange = ['NSE','BSE','NFO', 'BFO','CDS','MCX
             r = requests.get(f"{url}", allow_redirects=True)
             open(zip_file, "wb").write(r.content)
             df_ins_CDS = pd.read_csv(zip_file)
-            df_ins_CDS['Expiry'] = pd.to_datetime(df_ins_CDS['Expiry']).apply(lambda x: x.date())
+            df_ins_CDS['Expiry'] = pd.to_datetime(df_ins_CDS['Expiry']).dt.date
             df_ins_CDS = df_ins_CDS.sort_values(by=['Instrument','Expiry',"Symbol",'StrikePrice'], ascending=[False,True,True,True])
             df_ins_CDS = df_ins_CDS.astype({"StrikePrice": str})
             os.remove(zip_file)
@@ -1444,7 +1454,7 @@ def LoadInstrument_token(Token_4_Exchange = ['NSE','BSE','NFO', 'BFO','CDS','MCX
             r = requests.get(f"{url}", allow_redirects=True)
             open(zip_file, "wb").write(r.content)
             df_ins_MCX = pd.read_csv(zip_file)
-            df_ins_MCX['Expiry'] = pd.to_datetime(df_ins_MCX['Expiry']).apply(lambda x: x.date())
+            df_ins_MCX['Expiry'] = pd.to_datetime(df_ins_MCX['Expiry']).dt.date
             df_ins_MCX = df_ins_MCX.sort_values(by=['Instrument','Expiry',"Symbol",'StrikePrice'], ascending=[False,True,True,True])
             df_ins_MCX = df_ins_MCX.astype({"StrikePrice": str})
             os.remove(zip_file)
@@ -2023,8 +2033,8 @@ def start_optionchain():
                                 
                                 FromDateTime = dt.now() 
                                 if Exchange == 'NFO':
-                                    if dt.now().time() > time(15, 30, 0):
-                                        FromDateTime = dt(dt.now().year, dt.now().month,dt.now().day, 15, 30, 0)
+                                    if FromDateTime.time() > time(15, 30, 0):
+                                        FromDateTime = FromDateTime.replace(hour=15, minute=30, second=0, microsecond=0)
                                     
                                     
                                 if GreekMatch == "SENSIBULL":
@@ -2750,8 +2760,8 @@ def start_optionchain_Pro():
                                 
                                 FromDateTime = dt.now() 
                                 if Exchange == 'NFO':
-                                    if dt.now().time() > time(15, 30, 0):
-                                        FromDateTime = dt(dt.now().year, dt.now().month,dt.now().day, 15, 30, 0)
+                                    if FromDateTime.time() > time(15, 30, 0):
+                                        FromDateTime = FromDateTime.replace(hour=15, minute=30, second=0, microsecond=0)
                                     
                                     
                                 if GreekMatch == "SENSIBULL":
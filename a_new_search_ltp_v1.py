@@ -3,8 +3,11 @@ import sys
 import warnings
 import time
 import logging
-import os
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
+from contextlib import contextmanager
 import signal
 
 warnings.filterwarnings("ignore")
@@ -20,22 +23,33 @@ os.makedirs(log_dir, exist_ok=True)
 log_filename = datetime.now().strftime("trade_monitor_%Y%m%d_%H%M%S.log")
 log_path = os.path.join(log_dir, log_filename)
 
+# Records are queued by the caller and written to disk by a background listener
+file_handler = logging.FileHandler(log_path)
+file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s",
+                                            datefmt="%Y-%m-%d %H:%M:%S"))
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, file_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 logging.basicConfig(
-    filename=log_path,
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
+    format="%(message)s",  # file_handler applies the full format
+    handlers=[QueueHandler(log_queue)]
 )
 
+LOG_LEVEL_FUNCS = {
+    "info": logging.info,
+    "warning": logging.warning,
+    "error": logging.error,
+}
+
 def log_event(message, level="info"):
     """Log message to console + file"""
-    print(message)
-    if level == "info":
-        logging.info(message)
-    elif level == "warning":
-        logging.warning(message)
-    elif level == "error":
-        logging.error(message)
+    sys.stdout.write(message + "\n")
+    log_fn = LOG_LEVEL_FUNCS.get(level)
+    if log_fn:
+        log_fn(message)
 
 # Log program start
 log_event("🚀 Program starting...", level="info")
@@ -45,47 +59,106 @@ log_event("🚀 Program starting...", level="info")
 # ==============================
 try:
     import xlwings as xw
-except (ModuleNotFoundError, ImportError) as e:
-    log_event(f"Installing xlwings... Error: {str(e)}", level="warning")
-    os.system(f"{sys.executable} -m pip install -U xlwings")
-    import xlwings as xw
+except ImportError as e:
+    log_event(f"❌ xlwings is not available ({str(e)}). Install it with: pip install xlwings", level="error")
+    sys.exit(1)
 
 try:
     import pandas as pd
-except (ModuleNotFoundError, ImportError) as e:
-    log_event(f"Installing pandas... Error: {str(e)}", level="warning")
-    os.system(f"{sys.executable} -m pip install -U pandas")
-    import pandas as pd
+except ImportError as e:
+    log_event(f"❌ pandas is not available ({str(e)}). Install it with: pip install pandas", level="error")
+    sys.exit(1)
+
+import numpy as np  # installed with pandas
 
 
 # ==============================
 # --- Workbook Setup ----------
 # ==============================
+_own_app_pids = set()  # Excel instances started by this script
+
+
+def new_app():
+    """Dedicated Excel App for this script; alerts are only silenced on an App we own."""
+    app = xw.App(visible=True, add_book=False)
+    app.display_alerts = False
+    _own_app_pids.add(app.pid)
+    return app
+
+
+def open_book(filename):
+    """
+    Attach to the Excel instance that already has the workbook open (it may be
+    receiving live data), otherwise open it in a dedicated App of our own.
+    An attached instance keeps its alert and input settings; only excel_batch
+    briefly pauses its redraw/recalculation around position writes.
+    """
+    book_name = os.path.basename(filename)
+    for app in xw.apps:
+        if book_name in [b.name for b in app.books]:
+            return app.books[book_name]
+
+    return new_app().books.open(filename)
+
+
+@contextmanager
+def excel_batch(app):
+    """
+    Pause redraw and recalculation while a burst of writes runs, restoring the
+    previous settings afterwards. This also applies to an attached user App, so
+    a process killed mid-batch can leave it on manual calculation. User input
+    is only blocked on an App this script started.
+    """
+    block_input = app.pid in _own_app_pids
+    prev_screen_updating = app.screen_updating
+    prev_calculation = app.calculation
+    app.screen_updating = False
+    app.calculation = "manual"
+    if block_input:
+        try:
+            app.api.Interactive = False
+        except Exception:
+            pass  # not exposed outside Windows COM
+    try:
+        yield
+    finally:
+        if block_input:
+            try:
+                app.api.Interactive = True
+            except Exception:
+                pass
+        app.calculation = prev_calculation
+        app.screen_updating = prev_screen_updating
+
+
 def setup_workbook(filename="Finvasia_Trade_Terminal_v3.xlsm"):
-    if not os.path.exists(filename):
-        wb = xw.Book()
-        wb.save(filename)
-        wb.close()
+    # A missing workbook is built in a fresh App and saved once below, rather
+    # than saved, closed and reopened (openpyxl cannot write a macro-enabled .xlsm)
+    created = not os.path.exists(filename)
+    if created:
+        wb = new_app().books.add()
+    else:
+        wb = open_book(filename)
 
-    wb = xw.Book(filename)
     required_sheets = ["Trade_Terminal", "Option_Chain_Input", "Option_Chain_Output", "Chartink_Result"]
+    existing_sheets = {s.name for s in wb.sheets}
     for sheet in required_sheets:
-        if sheet not in [s.name for s in wb.sheets]:
+        if sheet not in existing_sheets:
             wb.sheets.add(sheet)
 
+    if created:
+        wb.save(filename)
+
     return wb
 
 
 # ==============================
 # --- Excel Access Helpers ----
 # ==============================
-def read_inputs(wb):
-    trade_terminal = wb.sheets["Trade_Terminal"]
-    option_chain_input = wb.sheets["Option_Chain_Input"]
-
+def read_inputs(trade_terminal, option_chain_input):
     symbol_name = option_chain_input.range("E3").value
     date_value = option_chain_input.range("E4").value
-    lot_size = int(option_chain_input.range("C2").value or 1)
+    lot_size = option_chain_input.range("C2").options(numbers=int).value or 1
 
     search_call_ltp = trade_terminal.range("AH2").value
     search_put_ltp = trade_terminal.range("AI2").value
@@ -103,55 +176,84 @@ def read_inputs(wb):
     }
 
 
+COLUMN_CHUNK_ROWS = 5000  # rows fetched per column read
+COLUMN_EMPTY_RUN = 100  # trailing empty rows that mark the end of the data
+EXCEL_MAX_ROWS = 1048576
+
+
+def read_column_values(sheet, column_letter):
+    """
+    Read the used part of a column in COLUMN_CHUNK_ROWS blocks instead of the
+    whole column.
+    """
+    values = []
+    start_row = 1
+    while start_row <= EXCEL_MAX_ROWS:
+        end_row = min(start_row + COLUMN_CHUNK_ROWS - 1, EXCEL_MAX_ROWS)
+        chunk = sheet.range(f"{column_letter}{start_row}:{column_letter}{end_row}").options(ndim=1).value
+        values.extend(chunk)
+        if all(v is None for v in chunk[-COLUMN_EMPTY_RUN:]):
+            break
+        start_row = end_row + 1
+
+    # drop the trailing empty cells
+    while values and values[-1] is None:
+        values.pop()
+
+    return values
+
+
+def find_last_row(sheet, col="A"):
+    """First empty row below the data in col (scans up from the bottom of the sheet)."""
+    return sheet.range(f"{col}{EXCEL_MAX_ROWS}").end("up").row + 1
+
+
 # ==============================
 # --- Position Writer ---------
 # ==============================
-def write_position(wb, symbol, expiry, search_ltp, lot_size,
-                   option_type="CALL", buy_or_sell="SELL", entry_signal="True_Market"):
-
-    trade_terminal = wb.sheets["Trade_Terminal"]
-    option_chain_output = wb.sheets["Option_Chain_Output"]
+# option type → (LTP search column, strike column, symbol side letter) in Option_Chain_Output
+OPTION_COLUMNS = {
+    "CALL": ("J", "P", "C"),
+    "PUT": ("V", "P", "P"),
+}
+
+def write_position(trade_terminal, option_chain_output, symbol, expiry, search_ltp, lot_size,
+                   option_type="CALL", buy_or_sell="SELL", entry_signal="True_Market", target_row=None):
+    """
+    Write a new order row to Trade_Terminal at target_row. Callers track the next
+    free row themselves; find_last_row is only used when target_row is not given.
+    """
 
     def find_nearest_row(sheet, column_letter, search_value):
-        values = sheet.range(f"{column_letter}:{column_letter}").value
-        numeric_values = [(i + 1, float(v)) for i, v in enumerate(values) if isinstance(v, (int, float))]
-        if not numeric_values:
+        values = read_column_values(sheet, column_letter)
+        arr = np.array([v if isinstance(v, (int, float)) else np.nan for v in values], dtype=np.float64)
+        if arr.size == 0 or np.isnan(arr).all():
             return None
-        return min(numeric_values, key=lambda x: abs(x[1] - float(search_value)))
-
-    def find_last_row(sheet, col="A"):
-        return sheet.range(col + str(sheet.cells.last_cell.row)).end("up").row + 1
-
-    # Column mapping based on option type
-    if option_type.upper() == "CALL":
-        strike_col = "J"
-        strike_read_col = "P"
-    elif option_type.upper() == "PUT":
-        strike_col = "V"
-        strike_read_col = "P"
-    else:
-        print(f"⚠️ Invalid option_type: {option_type}")
-        return None
+        idx = int(np.nanargmin(np.abs(arr - float(search_value))))
+        return (idx + 1, float(arr[idx]))
+
+    # Column mapping based on option type (KeyError on an unknown option_type)
+    strike_col, strike_read_col, side_letter = OPTION_COLUMNS[option_type.upper()]
 
     opt_row = find_nearest_row(option_chain_output, strike_col, search_ltp)
     if not opt_row:
         log_event(f"⚠️ No valid strike found in Option_Chain_Output for {option_type}.", level="warning")
         return None
 
-    strike_cell_value = option_chain_output.range(f"{strike_read_col}{opt_row[0]}").value
-    if strike_cell_value is None:
+    strike_price = option_chain_output.range(f"{strike_read_col}{opt_row[0]}").options(numbers=int).value
+    if strike_price is None:
         print(f"⚠️ Strike price cell is empty at {strike_read_col}{opt_row[0]} for {option_type}")
         return None
 
-    strike_price = int(strike_cell_value)
-    option_symbol = f"NFO:{symbol}{expiry}{'C' if option_type.upper()=='CALL' else 'P'}{strike_price}"
-    target_row = find_last_row(trade_terminal, "A")
+    option_symbol = f"NFO:{symbol}{expiry}{side_letter}{strike_price}"
+    if target_row is None:
+        target_row = find_last_row(trade_terminal, "A")
 
-    # Write to Excel
-    trade_terminal.range(f"A{target_row}").value = option_symbol
-    trade_terminal.range(f"M{target_row}").value = lot_size
-    trade_terminal.range(f"N{target_row}").value = buy_or_sell
-    trade_terminal.range(f"O{target_row}").value = entry_signal
+    # Write to Excel with redraw/recalc/input paused; B:L hold sheet formulas,
+    # so the symbol and the M:O order fields go out as two range writes
+    with excel_batch(trade_terminal.book.app):
+        trade_terminal.range(f"A{target_row}").value = option_symbol
+        trade_terminal.range(f"M{target_row}:O{target_row}").value = [lot_size, buy_or_sell, entry_signal]
 
     print(f"✅ {option_type} written → {option_symbol} at row {target_row} (Q pending)")
 
@@ -169,53 +271,119 @@ def write_position(wb, symbol, expiry, search_ltp, lot_size,
 # ==============================
 # --- Fetch Q & K Values ------
 # ==============================
-def fetch_qk_values(wb, executed_orders, per_order_timeout=5.0):
+Q_POLL_BASE = 0.05  # first retry delay (seconds) while Q cells are empty
+Q_POLL_GROWTH = 1.3  # retry delay grows as Q_POLL_BASE * Q_POLL_GROWTH**attempt
+Q_DELAY_ALPHA = 0.3  # EWMA weight of the latest Q populate delay
+
+_mean_q_delay = 0.5  # EWMA of seconds it takes Q cells to populate
+
+# Value2 (raw_value) returns Excel errors as these COM codes instead of None
+XL_ERROR_CODES = frozenset((
+    -2146826288,  # #NULL!
+    -2146826281,  # #DIV/0!
+    -2146826273,  # #VALUE!
+    -2146826265,  # #REF!
+    -2146826259,  # #NAME?
+    -2146826252,  # #NUM!
+    -2146826246,  # #N/A
+))
+
+
+def cell_to_float(value, fallback=0.0):
+    """Numeric value of a raw cell, or fallback for empty/error/non-numeric cells."""
+    if value is None or value in XL_ERROR_CODES:
+        return fallback
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return fallback
+
+
+NIFTY_LTP_ROW = 8  # NIFTY LTP lives in K8 of Trade_Terminal
+NIFTY_MAX_BLOCK_GAP = 20  # widen the K:Q block up to K8 only if that adds at most this many rows
+
+# (sheet id, address) → Range reused across ticks; a new block only appears after an adjustment
+_polled_ranges = {}
+
+
+def polled_range(sheet, address):
+    """Range object for an address read every tick, created once and reused."""
+    key = (id(sheet), address)
+    rng = _polled_ranges.get(key)
+    if rng is None:
+        rng = _polled_ranges[key] = sheet.range(address)
+    return rng
+
+
+def read_qk_block(trade_terminal, rows):
+    """
+    Read K..Q for the sorted rows in a single raw_value call, picking up the NIFTY
+    LTP in K8 in the same call when the legs sit within NIFTY_MAX_BLOCK_GAP rows
+    of it; otherwise K8 is read on its own so the block doesn't span the history.
+    Returns ({row: (q, k)}, nifty_ltp) as raw cell values; rows in between are dropped.
+    """
+    lo, hi = rows[0], rows[-1]
+    with_nifty = lo - NIFTY_LTP_ROW <= NIFTY_MAX_BLOCK_GAP
+    if with_nifty:
+        lo, hi = min(lo, NIFTY_LTP_ROW), max(hi, NIFTY_LTP_ROW)
+    block = polled_range(trade_terminal, f"K{lo}:Q{hi}").raw_value
+    if with_nifty:
+        nifty_ltp = block[NIFTY_LTP_ROW - lo][0]
+    else:
+        nifty_ltp = polled_range(trade_terminal, f"K{NIFTY_LTP_ROW}").raw_value
+    # K..Q → column offsets 0..6
+    return {r: (block[r - lo][6], block[r - lo][0]) for r in rows}, nifty_ltp
+
+
+def fetch_qk_values(trade_terminal, executed_orders, per_order_timeout=5.0):
     """
     Read Q and K values for all executed_orders.
-    Waits up to per_order_timeout seconds for each order's Q cell to become non-None.
-    Returns q_total, k_total, order_qk (dict mapping row -> (q,k)).
+    Q and K for every order are read in one K:Q raw_value (Value2) block per poll, retrying the
+    whole block until each order's Q cell is non-None or per_order_timeout expires.
+    Retry delays back off from Q_POLL_BASE up to twice the running mean populate delay.
+    Returns q_total, k_total, order_qk (dict mapping row -> (q,k)) and the NIFTY LTP
+    read in the same block (None if unavailable).
     """
-    trade_terminal = wb.sheets["Trade_Terminal"]
+    global _mean_q_delay
+    orders = [order for order in executed_orders if order]
     order_qk = {}
     q_total, k_total = 0.0, 0.0
 
-    for order in executed_orders:
-        if not order:
-            continue
+    if not orders:
+        return q_total, k_total, order_qk, None
 
-        row = order["row"]
-        q_value = None
-        start = time.time()
-        # wait up to per_order_timeout seconds for Q cell to populate
-        while q_value is None and (time.time() - start) < per_order_timeout:
-            try:
-                q_val = trade_terminal.range(f"Q{row}").value
-            except Exception:
-                q_val = None
-            if q_val is None:
-                time.sleep(0.2)
-            else:
-                # ensure numeric
-                try:
-                    q_value = float(q_val)
-                except Exception:
-                    q_value = q_val
-        # K value: read once (use 0 if missing)
+    rows = sorted({o["row"] for o in orders})
+    raw_qk, nifty_raw = {}, None
+    attempt = 0
+    start = time.time()
+    # wait up to per_order_timeout seconds for all Q cells to populate
+    while True:
         try:
-            k_read = trade_terminal.range(f"K{row}").value
-            k_value = float(k_read) if k_read is not None else 0.0
+            raw_qk, nifty_raw = read_qk_block(trade_terminal, rows)
         except Exception:
-            k_value = 0.0
+            raw_qk, nifty_raw = {}, None
+        if raw_qk and all(cell_to_float(q, None) is not None for q, _ in raw_qk.values()):
+            if attempt:
+                _mean_q_delay += Q_DELAY_ALPHA * ((time.time() - start) - _mean_q_delay)
+            break
+        if (time.time() - start) >= per_order_timeout:
+            break
+        time.sleep(min(Q_POLL_BASE * Q_POLL_GROWTH ** attempt, max(Q_POLL_BASE, _mean_q_delay * 2)))
+        attempt += 1
+
+    for order in orders:
+        row = order["row"]
+        q_raw, k_raw = raw_qk.get(row, (None, None))
 
         # keep order dict fields up-to-date
-        order["q_value"] = q_value or 0.0
-        order["k_value"] = k_value or 0.0
+        order["q_value"] = cell_to_float(q_raw)
+        order["k_value"] = cell_to_float(k_raw)
 
         q_total += order["q_value"]
         k_total += order["k_value"]
         order_qk[row] = (order["q_value"], order["k_value"])
 
-    return q_total, k_total, order_qk
+    return q_total, k_total, order_qk, cell_to_float(nifty_raw, None)
 
 
 # ==============================
@@ -225,31 +393,106 @@ def fetch_qk_values(wb, executed_orders, per_order_timeout=5.0):
 SQUARE_OFF_HOUR = 15  # 3 PM
 SQUARE_OFF_MINUTE = 29  # 3:20 PM
 ADJUSTMENT_HOUR_LIMIT = 14 # 2 PM
+ADJUSTMENT_TRIGGER_RATIO = 1.30  # Trigger A: combined premium up 30% on the baseline
+STATUS_LOG_MIN_CHANGE = 0.001  # re-log the status line once K total moves more than 0.1%
 
-def monitor_positions(wb, executed_orders, entry_total, symbol, expiry, lot_size):
+format_status = ("📊 Status → Positions: {} | Q Total: {:.2f} | K Total: {:.2f} | "
+                 "30% Trigger: {:.2f} | NIFTY: {}").format
+
+# --- Monitor poll cadence ---
+MONITOR_POLL_FAST = 0.25  # seconds between ticks near an adjustment trigger
+MONITOR_POLL_SLOW = 2.0  # seconds between ticks otherwise
+NEAR_TRIGGER_A_RATIO = 0.9  # K total within 90% of the 30% trigger
+NEAR_TRIGGER_B_LOW = 5  # Trigger B fires for a leg premium in 5-8; below 5 it never can
+NEAR_TRIGGER_B_PREMIUM = 10  # a leg's premium between 5 and this is near the 5-8 range
+
+
+def today_at(hour, minute):
+    """Epoch timestamp of hour:minute today (local time)."""
+    return datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0).timestamp()
+
+
+def sleep_until_next_work(poll_interval, now_ts, *deadlines):
+    """Poll interval shortened so the loop wakes up on the next upcoming deadline."""
+    upcoming = [deadline - now_ts for deadline in deadlines if deadline > now_ts]
+    return max(0.1, min([poll_interval, *upcoming]))
+
+
+def next_poll_interval(k_total, trigger_total, open_positions, adjustments_allowed):
+    """Poll fast when an adjustment trigger is close, slowly otherwise."""
+    if not adjustments_allowed:
+        return MONITOR_POLL_SLOW
+    if trigger_total and k_total >= trigger_total * NEAR_TRIGGER_A_RATIO:
+        return MONITOR_POLL_FAST
+    # a missing K (0) or a leg already below 5 cannot fire trigger B
+    if any(NEAR_TRIGGER_B_LOW <= (o.get("k_value") or 0) <= NEAR_TRIGGER_B_PREMIUM for o in open_positions):
+        return MONITOR_POLL_FAST
+    return MONITOR_POLL_SLOW
+
+# Set once monitor_positions is inside its try block and owns the open legs' square-off
+monitoring_started = False
+
+# SIGINT arriving inside defer_interrupt() is held until the block ends
+_interrupt_deferred = False
+_interrupt_pending = False
+
+
+@contextmanager
+def defer_interrupt():
+    """
+    Hold Ctrl-C while a leg is written and recorded, so an interrupt can never
+    land between the Excel write and the leg joining the square-off list.
+    """
+    global _interrupt_deferred, _interrupt_pending
+    _interrupt_deferred = True
+    try:
+        yield
+    finally:
+        _interrupt_deferred = False
+        if _interrupt_pending:
+            _interrupt_pending = False
+            raise KeyboardInterrupt
+
+
+def square_off_positions(trade_terminal, open_positions):
+    """Mark every open position's T cell with True_Market for square-off."""
+    for order in open_positions:
+        trade_terminal.range(f"T{order['row']}").value = "True_Market"
+        log_event(f"✍️ Marked row {order['row']} ({order['option_symbol']}) for Square_Off")
+
+
+def monitor_positions(trade_terminal, option_chain_output, executed_orders, entry_total, symbol, expiry, lot_size):
+    global monitoring_started
     log_event("\n🔄 Starting continuous monitoring based on new strategy...")
-    trade_terminal = wb.sheets["Trade_Terminal"]
 
     open_positions = list(executed_orders)
 
-    # Fetch initial Q values to establish the first baseline for the 30% rule
-    initial_q_total, _, _ = fetch_qk_values(wb, open_positions)
-    if initial_q_total == 0:
-        log_event("Warning: Initial Q values are zero. Falling back to search prices for initial adjustment baseline.", level="warning")
-        initial_q_total = entry_total
+    try:
+        monitoring_started = True
 
-    log_event(f"📈 Initial Combined Premium (Q Total) for adjustments: {initial_q_total:.2f}", level="info")
+        # Fetch initial Q values to establish the first baseline for the 30% rule
+        initial_q_total, _, _, _ = fetch_qk_values(trade_terminal, open_positions)
+        if initial_q_total == 0:
+            log_event("Warning: Initial Q values are zero. Falling back to search prices for initial adjustment baseline.", level="warning")
+            initial_q_total = entry_total
+
+        log_event(f"📈 Initial Combined Premium (Q Total) for adjustments: {initial_q_total:.2f}", level="info")
+        # Only changes when the baseline is reset after an adjustment
+        adjustment_trigger = initial_q_total * ADJUSTMENT_TRIGGER_RATIO
+
+        last_order_qk = None
+        last_status = None  # (positions, q_total, k_total) of the last logged status line
+        square_off_ts = today_at(SQUARE_OFF_HOUR, SQUARE_OFF_MINUTE)
+        adjustment_cutoff_ts = today_at(ADJUSTMENT_HOUR_LIMIT, 0)
 
-    try:
         while True:
-            now = datetime.now()
+            now_ts = time.time()
+            adjustments_allowed = now_ts < adjustment_cutoff_ts
 
             # 1. Check for end-of-day square-off
-            if now.hour == SQUARE_OFF_HOUR and now.minute >= SQUARE_OFF_MINUTE:
-                log_event(f"⏰ Auto square-off all open positions at {now.strftime('%H:%M:%S')}!", level="warning")
-                for order in open_positions:
-                    trade_terminal.range(f"T{order['row']}").value = "True_Market"
-                    log_event(f"✍️ Marked row {order['row']} ({order['option_symbol']}) for Square_Off")
+            if now_ts >= square_off_ts:
+                log_event(f"⏰ Auto square-off all open positions at {datetime.fromtimestamp(now_ts).strftime('%H:%M:%S')}!", level="warning")
+                square_off_positions(trade_terminal, open_positions)
                 break # Exit monitoring loop
 
             if not open_positions:
@@ -257,37 +500,49 @@ def monitor_positions(wb, executed_orders, entry_total, symbol, expiry, lot_size
                 break
 
             # Fetch latest prices for all open positions
-            q_total, k_total, order_qk = fetch_qk_values(wb, open_positions)
+            q_total, k_total, order_qk, nifty_ltp = fetch_qk_values(trade_terminal, open_positions)
+
+            # Triggers only depend on Q/K, so an unchanged block needs no evaluation
+            if order_qk == last_order_qk:
+                poll_interval = next_poll_interval(k_total, adjustment_trigger, open_positions, adjustments_allowed)
+                time.sleep(sleep_until_next_work(poll_interval, time.time(), adjustment_cutoff_ts, square_off_ts))
+                continue
+            last_order_qk = order_qk
 
-            # Log current status
-            nifty_ltp = trade_terminal.range("K8").value
-            log_event(f"📊 Status → Positions: {len(open_positions)} | Q Total: {q_total:.2f} | K Total: {k_total:.2f} | "
-                      f"30% Trigger: {initial_q_total * 1.3:.2f} | NIFTY: {nifty_ltp}")
+            # Log current status when positions/Q change or K total moves noticeably
+            if (last_status is None or last_status[:2] != (len(open_positions), q_total)
+                    or abs(k_total - last_status[2]) > abs(last_status[2]) * STATUS_LOG_MIN_CHANGE):
+                log_event(format_status(len(open_positions), q_total, k_total, adjustment_trigger, nifty_ltp))
+                last_status = (len(open_positions), q_total, k_total)
+
+            # Leg premiums (K) in open_positions order, for the vectorized checks below
+            k_arr = np.array([o.get("k_value") or 0.0 for o in open_positions], dtype=np.float64)
 
             # 2. Check for adjustment triggers (must be before 2 PM)
             adjustment_triggered = False
-            if now.hour < ADJUSTMENT_HOUR_LIMIT:
+            if adjustments_allowed:
                 # Trigger A: Combined premium increased by 30%
-                if k_total >= initial_q_total * 1.30:
-                    log_event(f"🔥 Adjustment Trigger A: Combined premium {k_total:.2f} >= 30% threshold {initial_q_total * 1.30:.2f}", level="warning")
+                if k_total >= adjustment_trigger:
+                    log_event(f"🔥 Adjustment Trigger A: Combined premium {k_total:.2f} >= 30% threshold {adjustment_trigger:.2f}", level="warning")
                     adjustment_triggered = True
 
                 # Trigger B: One leg's premium dropped to 5-8 range
                 if not adjustment_triggered:
-                    for order in open_positions:
-                        if 5 <= (order.get("k_value") or 0) <= 8:
-                            log_event(f"🔥 Adjustment Trigger B: Leg {order['option_symbol']} premium is {order['k_value']:.2f} (in 5-8 range)", level="warning")
-                            adjustment_triggered = True
-                            break
+                    trigger_b_mask = (k_arr >= 5) & (k_arr <= 8)
+                    if trigger_b_mask.any():
+                        order = open_positions[int(np.argmax(trigger_b_mask))]
+                        log_event(f"🔥 Adjustment Trigger B: Leg {order['option_symbol']} premium is {order['k_value']:.2f} (in 5-8 range)", level="warning")
+                        adjustment_triggered = True
 
             # 3. Perform Adjustment if triggered
             if adjustment_triggered:
                 if len(open_positions) < 2:
                     log_event("⚠️ Adjustment triggered, but less than 2 open positions. Cannot perform adjustment.", level="warning")
                 else:
-                    # Identify profitable and unprofitable legs
-                    profitable_leg = min(open_positions, key=lambda o: o.get("k_value") or float('inf'))
-                    unprofitable_leg = max(open_positions, key=lambda o: o.get("k_value") or float('-inf'))
+                    # Identify profitable and unprofitable legs (legs without a K value are skipped)
+                    has_k = k_arr != 0
+                    profitable_leg = open_positions[int(np.argmin(np.where(has_k, k_arr, np.inf)))]
+                    unprofitable_leg = open_positions[int(np.argmax(np.where(has_k, k_arr, -np.inf)))]
 
                     log_event(f"Identified Profitable Leg: {profitable_leg['option_symbol']} @ {profitable_leg['k_value']:.2f}", level="info")
                     log_event(f"Identified Unprofitable Leg: {unprofitable_leg['option_symbol']} @ {unprofitable_leg['k_value']:.2f}", level="info")
@@ -303,22 +558,25 @@ def monitor_positions(wb, executed_orders, entry_total, symbol, expiry, lot_size
 
                     # c. Write the new leg
                     log_event(f"🔎 Searching for new {profitable_leg['option_type']} with premium near {new_premium_target:.2f}", level="info")
-                    new_order = write_position(
-                        wb, symbol, expiry, new_premium_target, lot_size,
-                        option_type=profitable_leg['option_type'],
-                        buy_or_sell="SELL"
-                    )
+                    with defer_interrupt():
+                        new_order = write_position(
+                            trade_terminal, option_chain_output, symbol, expiry, new_premium_target, lot_size,
+                            option_type=profitable_leg['option_type'],
+                            buy_or_sell="SELL"  # next free row is looked up now; users add rows by hand
+                        )
+                        if new_order:
+                            open_positions.append(new_order)
 
                     if new_order:
                         log_event(f"✅ New position written: {new_order['option_symbol']}", level="info")
-                        open_positions.append(new_order)
 
                         # d. Recalculate the baseline premium for the 30% rule
                         log_event("Waiting for new position's Q value to update...", level="info")
                         time.sleep(5) # Give Excel time to update Q value
-                        new_q_total, _, _ = fetch_qk_values(wb, open_positions)
+                        new_q_total, _, _, _ = fetch_qk_values(trade_terminal, open_positions)
                         if new_q_total > 0:
                             initial_q_total = new_q_total
+                            adjustment_trigger = initial_q_total * ADJUSTMENT_TRIGGER_RATIO
                             log_event(f"🔁 Baseline premium for 30% rule has been updated to: {initial_q_total:.2f}", level="info")
                         else:
                             log_event("⚠️ Could not get new Q values to update baseline. Baseline remains unchanged.", level="warning")
@@ -331,8 +589,14 @@ def monitor_positions(wb, executed_orders, entry_total, symbol, expiry, lot_size
                     continue # Restart loop to get fresh data for all positions
 
             # Main loop sleep
-            time.sleep(1)
-
+            poll_interval = next_poll_interval(k_total, adjustment_trigger, open_positions, adjustments_allowed)
+            time.sleep(sleep_until_next_work(poll_interval, time.time(), adjustment_cutoff_ts, square_off_ts))
+
+    except KeyboardInterrupt:
+        # Don't leave legs unmanaged when monitoring is interrupted
+        log_event("⚠️ Monitoring interrupted, squaring off all open positions", level="warning")
+        square_off_positions(trade_terminal, open_positions)
+        raise
     except Exception as e:
         log_event(f"❌ Critical error in monitoring: {str(e)}", level="error")
         import traceback
@@ -344,36 +608,53 @@ def monitor_positions(wb, executed_orders, entry_total, symbol, expiry, lot_size
 # ==============================
 # --- Main --------------------
 # ==============================
+def signal_handler(sig, frame):
+    global _interrupt_pending
+    log_event("⚠️ Program interrupted by user", level="warning")
+    if _interrupt_deferred:
+        _interrupt_pending = True
+        return
+    raise KeyboardInterrupt
+
+signal.signal(signal.SIGINT, signal_handler)
+
 if __name__ == "__main__":
+    executed_orders = []
     try:
         log_event("📘 Starting program execution")
         wb = setup_workbook()
-        inputs = read_inputs(wb)
+        trade_terminal = wb.sheets["Trade_Terminal"]
+        option_chain_input = wb.sheets["Option_Chain_Input"]
+        option_chain_output = wb.sheets["Option_Chain_Output"]
+        inputs = read_inputs(trade_terminal, option_chain_input)
 
         log_event("📘 Workbook and sheets ready.")
         log_event("➡️ Input values loaded:")
         for k, v in inputs.items():
             log_event(f"   {k}: {v}")
 
-        executed_orders = []
+        next_row = find_last_row(trade_terminal, "A")
 
         # Execute CALL
-        call_order = write_position(
-            wb, inputs["symbol"], inputs["expiry"],
-            inputs["search_call_ltp"], inputs["lot_size"],
-            option_type="CALL", buy_or_sell="SELL"
-        )
-        if call_order:
-            executed_orders.append(call_order)
+        with defer_interrupt():
+            call_order = write_position(
+                trade_terminal, option_chain_output, inputs["symbol"], inputs["expiry"],
+                inputs["search_call_ltp"], inputs["lot_size"],
+                option_type="CALL", buy_or_sell="SELL", target_row=next_row
+            )
+            if call_order:
+                executed_orders.append(call_order)
+                next_row += 1
 
         # Execute PUT
-        put_order = write_position(
-            wb, inputs["symbol"], inputs["expiry"],
-            inputs["search_put_ltp"], inputs["lot_size"],
-            option_type="PUT", buy_or_sell="SELL"
-        )
-        if put_order:
-            executed_orders.append(put_order)
+        with defer_interrupt():
+            put_order = write_position(
+                trade_terminal, option_chain_output, inputs["symbol"], inputs["expiry"],
+                inputs["search_put_ltp"], inputs["lot_size"],
+                option_type="PUT", buy_or_sell="SELL", target_row=next_row
+            )
+            if put_order:
+                executed_orders.append(put_order)
 
         if not executed_orders:
             log_event("❌ No positions executed. Exiting.", level="warning")
@@ -381,8 +662,14 @@ if __name__ == "__main__":
             log_event("Waiting for positions to initialize before monitoring...", level="info")
             time.sleep(5) # Give Excel time to populate Q values
             entry_total_fallback = (inputs["search_call_ltp"] or 0) + (inputs["search_put_ltp"] or 0)
-            monitor_positions(wb, executed_orders, entry_total_fallback,
+            monitor_positions(trade_terminal, option_chain_output, executed_orders, entry_total_fallback,
                             inputs["symbol"], inputs["expiry"], inputs["lot_size"])
+    except KeyboardInterrupt:
+        # Logged by signal_handler; once monitor_positions is inside its try it
+        # squares off its own legs, anything placed before that is closed here
+        if executed_orders and not monitoring_started:
+            log_event("⚠️ Interrupted before monitoring started, squaring off placed positions", level="warning")
+            square_off_positions(trade_terminal, executed_orders)
     except Exception as e:
         log_event(f"❌ CRITICAL ERROR: {str(e)}", level="error")
         import traceback
@@ -390,9 +677,3 @@ if __name__ == "__main__":
     finally:
         log_event("🏁 Program execution completed", level="info")
 
-
-def signal_handler(sig, frame):
-    log_event("⚠️ Program interrupted by user", level="warning")
-    sys.exit(0)
-
-signal.signal(signal.SIGINT, signal_handler)